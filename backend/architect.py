@@ -3,15 +3,58 @@ Guided Component Architect - Main Orchestrator
 Agentic pipeline: Generate → Validate → Self-Correct → Output
 """
 
-import json
+import atexit
+import logging
+import logging.handlers
+import queue
 import re
 import os
 import sys
+import threading
+from functools import lru_cache
 from pathlib import Path
+from typing import Callable
+import orjson
 from groq import Groq
 
+logger = logging.getLogger("architect")
+
 MAX_RETRIES = 2
 MODEL = "llama-3.3-70b-versatile"
+PRECHECK_CHARS = 64
+BAD_OPENING = "bad_opening"  # finish_reason reported when the pre-check aborts a stream
+FIRST_ATTEMPT_MAX_TOKENS = 2048
+RETRY_MAX_TOKENS = 3072
+# A long blank run means the model is done with code. "```" is deliberately not a stop:
+# a fenced opening must reach the pre-check so the retry is told to drop the fences.
+STOP_SEQUENCES = ["\n\n\n\n"]
+AUTOFIX_MAX_COLOR_DISTANCE = 48  # RGB Euclidean; beyond this a color is a choice, not a typo
+HISTORY_TOKEN_BUDGET = 3000
+HISTORY_HEAD_MESSAGES = 2
+
+_RE_PX = re.compile(r"^\d+px$")
+
+
+def configure_logging(level: str | int | None = None) -> None:
+    # Records go through a queue and are written by a listener thread, so request
+    # handlers never block on stdout. LOG_LEVEL=WARNING silences per-attempt chatter.
+    if logger.handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    level = level or (os.environ.get("LOG_LEVEL") or "INFO").upper()
+    # A typo in LOG_LEVEL must not stop the server from booting.
+    if isinstance(level, str) and not isinstance(logging.getLevelName(level), int):
+        logger.setLevel(logging.INFO)
+        logger.warning("Unknown LOG_LEVEL %r, falling back to INFO", level)
+    else:
+        logger.setLevel(level)
 
 
 def load_design_tokens() -> dict:
@@ -23,13 +66,19 @@ def load_design_tokens() -> dict:
     ]
     for p in possible_paths:
         if p.exists():
-            with open(p) as f:
-                return json.load(f)
+            with open(p, "rb") as f:
+                return orjson.loads(f.read())
     raise FileNotFoundError("tokens.json not found")
 
 
 def build_system_prompt(tokens: dict) -> str:
-    token_str = json.dumps(tokens, indent=2)
+    # Keyed on the serialized tokens so identical tokens always yield the
+    # byte-identical prompt — Groq's prompt cache matches on exact prefixes.
+    return _build_system_prompt(orjson.dumps(tokens, option=orjson.OPT_INDENT_2).decode())
+
+
+@lru_cache(maxsize=8)
+def _build_system_prompt(token_str: str) -> str:
     return f"""You are an expert Angular/TypeScript developer and UI designer.
 Generate COMPLETE, VALID, VISUALLY IMPRESSIVE Angular components using inline styles.
 
@@ -73,175 +122,379 @@ End with the closing brace of the exported class. NOTHING else before or after.
 """
 
 
-def generate_component(client: Groq, system_prompt: str, user_prompt: str, feedback: str = "") -> str:
-    messages = [{"role": "user", "content": user_prompt}]
+# Loaded once per process; call reload_tokens() after editing tokens.json.
+TOKENS: dict | None = None
+SYSTEM_PROMPT: str | None = None
+_TOKEN_RULES: tuple[dict, dict] | None = None
+
+
+def reload_tokens() -> dict:
+    global TOKENS, SYSTEM_PROMPT, _TOKEN_RULES
+    tokens = load_design_tokens()
+    _TOKEN_RULES = (tokens, _build_token_rules(tokens))
+    SYSTEM_PROMPT = build_system_prompt(tokens)
+    TOKENS = tokens
+    return tokens
+
+
+def _build_token_rules(tokens: dict) -> dict:
+    colors = set(tokens.get("colors", {}).values())
+    radii = set(tokens.get("borders", {}).values())
+    fonts = [
+        tokens["typography"]["font-family-sans"],
+        tokens["typography"]["font-family-mono"],
+        "Inter", "JetBrains Mono", "sans-serif", "monospace", "serif",
+        "inherit", "initial", "unset",
+    ]
+    return {
+        "colors":        frozenset(c.lower() for c in colors),
+        "colors_sorted": sorted(colors),
+        "colors_rgb":    [(c, _hex_to_rgb(c)) for c in sorted(colors) if len(c) == 7],
+        "hex_ok":        _allowed_hex_literals(colors),
+        "radii":         frozenset(radii),
+        "radii_px":      sorted(v for v in radii if "px" in str(v)),
+        "fonts":         tuple(f.lower() for f in fonts),
+    }
+
+
+def _allowed_hex_literals(colors: set) -> frozenset:
+    # Every allowed color as it may appear after '#' (lowercased), including #rgb shorthand,
+    # so the common compliant case is one set lookup with no normalization.
+    literals = set()
+    for c in colors:
+        h = c.lstrip("#").lower()
+        literals.add(h)
+        if len(h) == 6 and h[0::2] == h[1::2]:
+            literals.add(h[0::2])
+    return frozenset(literals)
+
+
+def _hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
+    h = hex_color.lstrip("#")
+    if len(h) == 3:
+        h = "".join(c * 2 for c in h)
+    return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+
+
+def _token_rules(tokens: dict) -> dict:
+    # Lookup sets for the loaded tokens are built once; any other dict is compiled on demand.
+    cached = _TOKEN_RULES
+    if cached is not None and cached[0] is tokens:
+        return cached[1]
+    return _build_token_rules(tokens)
+
+
+try:
+    reload_tokens()
+except (FileNotFoundError, orjson.JSONDecodeError, KeyError) as e:
+    logger.warning("Design tokens not loaded at import: %s", e)
+
+
+_clients: dict[str, Groq] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str) -> Groq:
+    # One client per key so the underlying httpx pool keeps connections to Groq warm.
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = Groq(api_key=api_key)
+        return client
+
+
+def generate_component(
+    client: Groq,
+    system_prompt: str,
+    user_prompt: str,
+    feedback: str = "",
+    history: list = None,
+    on_token: Callable[[str], None] | None = None,
+    previous_code: str = "",
+    max_tokens: int = FIRST_ATTEMPT_MAX_TOKENS,
+    precheck: bool = True,
+) -> tuple[str, str | None]:
+    # Returns the code plus the stream's finish_reason ("stop", "length", ...).
+    # Order is fixed so the prefix stays cacheable: system → history → prompt → retry turns.
+    # Anything that changes between calls must only ever be appended at the tail.
+    messages = [{"role": "system", "content": system_prompt}]
+    messages += [{"role": h["role"], "content": h["content"]} for h in history or []]
+    messages.append({"role": "user", "content": user_prompt})
     if feedback:
-        messages = [
-            {"role": "user", "content": user_prompt},
-            {"role": "assistant", "content": "// previous attempt had errors"},
-            {
-                "role": "user",
-                "content": f"Fix ALL these validation errors and regenerate the COMPLETE component:\n\n{feedback}\n\nOutput ONLY raw TypeScript. No markdown.",
-            },
-        ]
+        # The rejected attempt goes back as the assistant turn so the model patches it
+        # rather than starting over.
+        if previous_code:
+            messages.append({"role": "assistant", "content": previous_code})
+        messages.append({
+            "role": "user",
+            "content": f"Fix ALL these validation errors and regenerate the COMPLETE component:\n\n{feedback}\n\nOutput ONLY raw TypeScript. No markdown.",
+        })
 
     response = client.chat.completions.create(
         model=MODEL,
-        messages=[{"role": "system", "content": system_prompt}, *messages],
+        messages=messages,
         temperature=0.3,
-        max_tokens=4096,
+        max_tokens=max_tokens,
+        stop=STOP_SEQUENCES,
+        stream=True,
     )
-    return response.choices[0].message.content.strip()
+    parts = []
+    checked = not precheck  # with no retry left, a prose/fenced component beats a fragment
+    finish_reason = None
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        text = chunk.choices[0].delta.content
+        if not text:
+            continue
+        parts.append(text)
+        if on_token:
+            on_token(text)
+        if not checked and sum(map(len, parts)) >= PRECHECK_CHARS:
+            checked = True
+            if _bad_opening("".join(parts)):
+                # Closing the stream stops generation server-side; run_pipeline turns
+                # this finish_reason into a specific OUTPUT_FORMAT error for the retry.
+                response.close()
+                finish_reason = BAD_OPENING
+                break
+    return "".join(parts).strip(), finish_reason
+
+
+def _bad_opening(head: str) -> bool:
+    head = head.lstrip()
+    return head.startswith("```") or not head.startswith(("import", "@Component", "//", "/*"))
 
 
 # ─────────────────────────────────────────────
 # VALIDATOR / LINTER AGENT
 # ─────────────────────────────────────────────
 
+_RE_EXPORT_CLASS = re.compile(r"export\s+class\s+\w+")
+# Radius/font are lookaheads so a declaration swallowed by another one's value
+# (e.g. a missing ';') is still seen, exactly as with separate scans.
+_RE_TOKEN_USAGE = re.compile(
+    r"#(?P<hex>[0-9a-fA-F]{3,8})\b"
+    r"|(?=border-?[Rr]adius[:\s]+(?P<radius>[^;\"'`}]+))"
+    r"|(?=font-family[:\s]+(?P<font>[^;\"'`}]+))"
+)
+# "prop: value" ending in ; } or a quote — a selector like `a:hover #add {` runs into '{' and is skipped.
+_RE_CSS_DECL = re.compile(r"([\w-]+\s*:\s*)([^;{}\"'`]+)(?=[;}\"'`]|$)")
+_RE_HEX_LITERAL = re.compile(r"#[0-9a-fA-F]{3,8}\b")
+_RE_BRACKET_TOKENS = re.compile(
+    r'''"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?|`(?:[^`\\]|\\.)*`?|[(){}\[\]]''',
+    re.DOTALL,
+)
+
+
 class ValidationError:
-    def __init__(self, rule: str, message: str, severity: str = "error"):
+    def __init__(self, rule: str, message: str, severity: str = "error", value: str | None = None):
         self.rule = rule
         self.message = message
         self.severity = severity
+        self.value = value  # offending literal as written in the code, when there is one
 
     def __str__(self):
         return f"[{self.severity.upper()}] {self.rule}: {self.message}"
 
+    __repr__ = __str__
+
+
+_STRUCTURE_CHECKS = (
+    (("@Component",),                "Missing @Component decorator"),
+    (("selector:",),                 "Missing selector in @Component"),
+    (("template:", "templateUrl:"),  "Missing template in @Component"),
+)
+
 
 def validate_component(code: str, tokens: dict) -> list[ValidationError]:
     errors = []
+    fenced = code.strip().startswith("```") or "```" in code[:50]
 
-    if "@Component" not in code:
-        errors.append(ValidationError("ANGULAR_STRUCTURE", "Missing @Component decorator"))
-    if "selector:" not in code:
-        errors.append(ValidationError("ANGULAR_STRUCTURE", "Missing selector in @Component"))
-    if "template:" not in code and "templateUrl:" not in code:
-        errors.append(ValidationError("ANGULAR_STRUCTURE", "Missing template in @Component"))
-    if not re.search(r"export\s+class\s+\w+", code):
+    for needles, message in _STRUCTURE_CHECKS:
+        if not any(n in code for n in needles):
+            errors.append(ValidationError("ANGULAR_STRUCTURE", message))
+    if not _RE_EXPORT_CLASS.search(code):
         errors.append(ValidationError("ANGULAR_STRUCTURE", "Missing exported class"))
 
-    errors.extend(_check_bracket_balance(code))
-    errors.extend(_check_color_compliance(code, tokens))
-    errors.extend(_check_border_radius_compliance(code, tokens))
-    errors.extend(_check_font_compliance(code, tokens))
+    # Fenced or stub output is getting regenerated anyway — don't lint it token by token.
+    short_circuit = bool(errors) and (fenced or len(code) < 200)
+    if not short_circuit:
+        errors.extend(_check_bracket_balance(code))
+        errors.extend(_check_token_compliance(code, tokens))
 
-    if code.strip().startswith("```") or "```" in code[:50]:
+    if fenced:
         errors.append(ValidationError("OUTPUT_FORMAT", "Code wrapped in markdown fences — output raw code only"))
 
     return errors
 
 
+def _autofix(code: str, errors: list[ValidationError], tokens: dict) -> tuple[str, list[ValidationError]]:
+    # Near-miss colors have an obvious fix — snap them locally instead of paying for another
+    # full generation. Colors far from every palette entry are a design decision, so those
+    # stay with the LLM retry. Radius findings are only warnings (they never cost a retry),
+    # and a 0px corner or 999px pill is usually intentional, so those are left as written.
+    rules = _token_rules(tokens)
+    remaining = []
+    color_map = {}
+    for e in errors:
+        nearest = None
+        if e.rule == "DESIGN_TOKEN_COLOR" and e.value and len(e.value) in (4, 7):
+            nearest = _nearest_color(e.value, rules)
+        if nearest:
+            color_map[e.value] = nearest
+        else:
+            remaining.append(e)
+    # Only rewrite inside CSS declaration values, so ids and anchors like #add or
+    # #facade are left alone; anything missed is caught when the caller re-validates.
+    if color_map:
+        code = _RE_CSS_DECL.sub(
+            lambda m: m.group(1) + _RE_HEX_LITERAL.sub(lambda h: color_map.get(h.group(), h.group()), m.group(2)),
+            code,
+        )
+    return code, remaining
+
+
+def _nearest_color(hex_color: str, rules: dict) -> str | None:
+    r, g, b = _hex_to_rgb(hex_color)
+    best, dist_sq = None, AUTOFIX_MAX_COLOR_DISTANCE ** 2
+    for candidate, (cr, cg, cb) in rules["colors_rgb"]:
+        d = (cr - r) ** 2 + (cg - g) ** 2 + (cb - b) ** 2
+        if d <= dist_sq:
+            best, dist_sq = candidate, d
+    return best
+
+
 def _check_bracket_balance(code: str) -> list[ValidationError]:
     errors = []
     stack = []
     pairs = {")": "(", "}": "{", "]": "["}
-    opens = set("({[")
-    closes = set(")}]")
-
-    in_string = False
-    string_char = None
-    i = 0
-    while i < len(code):
-        ch = code[i]
-        if in_string:
-            if ch == "\\" and i + 1 < len(code):
-                i += 2
-                continue
-            if ch == string_char:
-                in_string = False
-        else:
-            if ch in ('"', "'", "`"):
-                in_string = True
-                string_char = ch
-            elif ch in opens:
-                stack.append(ch)
-            elif ch in closes:
-                if not stack or stack[-1] != pairs[ch]:
-                    errors.append(ValidationError("SYNTAX", f"Unmatched closing bracket '{ch}' at position {i}"))
-                    return errors
-                stack.pop()
-        i += 1
+
+    # Quoted strings are consumed whole (an unterminated one runs to the end of the code),
+    # so only the brackets outside strings reach this loop.
+    for m in _RE_BRACKET_TOKENS.finditer(code):
+        ch = m.group()
+        if ch in "([{":
+            stack.append(ch)
+        elif ch in ")]}":
+            if not stack or stack[-1] != pairs[ch]:
+                errors.append(ValidationError("SYNTAX", f"Unmatched closing bracket '{ch}' at position {m.start()}"))
+                return errors
+            stack.pop()
 
     if stack:
         errors.append(ValidationError("SYNTAX", f"Unclosed brackets: {stack}"))
     return errors
 
 
-def _check_color_compliance(code: str, tokens: dict) -> list[ValidationError]:
+def _check_token_compliance(code: str, tokens: dict) -> list[ValidationError]:
+    # One pass over the code for colors, radii and fonts. Errors are still grouped
+    # color → radius → font so retry feedback reads the same as before.
+    rules = _token_rules(tokens)
+    color_errors, radius_errors, font_errors = [], [], []
+    radius_end = font_end = 0
+    for m in _RE_TOKEN_USAGE.finditer(code):
+        kind = m.lastgroup
+        if kind == "hex":
+            hex_val = m.group("hex")
+            if hex_val.lower() not in rules["hex_ok"]:
+                color_errors.extend(_check_color(hex_val, rules))
+        elif kind == "radius" and m.start() >= radius_end:
+            radius_end = m.end("radius")
+            radius_errors.extend(_check_border_radius(m.group("radius"), rules))
+        elif kind == "font" and m.start() >= font_end:
+            font_end = m.end("font")
+            font_errors.extend(_check_font(m.group("font"), rules))
+    return color_errors + radius_errors + font_errors
+
+
+def _check_color(hex_val: str, rules: dict) -> list[ValidationError]:
+    full = f"#{hex_val}"
+    if len(hex_val) == 3:
+        full = "#" + "".join(c * 2 for c in hex_val)
+    if full.lower() in rules["colors"]:
+        return []
+    return [ValidationError(
+        "DESIGN_TOKEN_COLOR",
+        f"Color '{full}' NOT in design system. Allowed: {rules['colors_sorted']}",
+        severity="error",
+        value=f"#{hex_val}",
+    )]
+
+
+def _check_border_radius(value: str, rules: dict) -> list[ValidationError]:
     errors = []
-    allowed_colors = set(tokens.get("colors", {}).values())
-    hex_colors = re.findall(r"#([0-9a-fA-F]{3,8})\b", code)
-    for hex_val in hex_colors:
-        full = f"#{hex_val}"
-        if len(hex_val) == 3:
-            full = "#" + "".join(c * 2 for c in hex_val)
-        if full.lower() not in [c.lower() for c in allowed_colors]:
+    for val in value.strip().split():
+        val = val.rstrip(";,\"'")
+        if _RE_PX.match(val) and val not in rules["radii"]:
             errors.append(ValidationError(
-                "DESIGN_TOKEN_COLOR",
-                f"Color '{full}' NOT in design system. Allowed: {sorted(allowed_colors)}",
-                severity="error",
+                "DESIGN_TOKEN_RADIUS",
+                f"border-radius '{val}' not in design system. Allowed: {rules['radii_px']}",
+                severity="warning",
+                value=val,
             ))
     return errors
 
 
-def _check_border_radius_compliance(code: str, tokens: dict) -> list[ValidationError]:
-    errors = []
-    allowed_radii = set(tokens.get("borders", {}).values())
-    radius_matches = re.findall(r"border-?[Rr]adius[:\s]+([^;\"'`}]+)", code)
-    for match in radius_matches:
-        for val in match.strip().split():
-            val = val.rstrip(";,\"'")
-            if re.match(r"^\d+px$", val) and val not in allowed_radii:
-                errors.append(ValidationError(
-                    "DESIGN_TOKEN_RADIUS",
-                    f"border-radius '{val}' not in design system. Allowed: {sorted(v for v in allowed_radii if 'px' in str(v))}",
-                    severity="warning",
-                ))
-    return errors
-
-
-def _check_font_compliance(code: str, tokens: dict) -> list[ValidationError]:
-    errors = []
-    allowed_fonts = [
-        tokens["typography"]["font-family-sans"],
-        tokens["typography"]["font-family-mono"],
-        "Inter", "JetBrains Mono", "sans-serif", "monospace", "serif",
-        "inherit", "initial", "unset",
-    ]
-    font_matches = re.findall(r"font-family[:\s]+([^;\"'`}]+)", code)
-    for match in font_matches:
-        match_clean = match.strip().strip("'\"").strip()
-        if not match_clean:
-            continue
-        if any(af.lower() in match.lower() for af in allowed_fonts):
-            continue
-        errors.append(ValidationError(
-            "DESIGN_TOKEN_FONT",
-            f"Font '{match_clean}' not in design system. Use 'Inter' or 'JetBrains Mono'",
-            severity="warning",
-        ))
-    return errors
+def _check_font(value: str, rules: dict) -> list[ValidationError]:
+    match_clean = value.strip().strip("'\"").strip()
+    if not match_clean:
+        return []
+    value_lc = value.lower()
+    if any(af in value_lc for af in rules["fonts"]):
+        return []
+    return [ValidationError(
+        "DESIGN_TOKEN_FONT",
+        f"Font '{match_clean}' not in design system. Use 'Inter' or 'JetBrains Mono'",
+        severity="warning",
+    )]
 
 
 # ─────────────────────────────────────────────
 # MAIN PIPELINE
 # ─────────────────────────────────────────────
 
-def run_pipeline(user_prompt: str, api_key: str, conversation_history: list = None) -> dict:
-    client = Groq(api_key=api_key)
-    tokens = load_design_tokens()
-    system_prompt = build_system_prompt(tokens)
-
-    full_prompt = user_prompt
-    if conversation_history:
-        history_str = "\n".join(
-            [f"[Previous - {h['role']}]: {h['content'][:200]}..." for h in conversation_history[-4:]]
-        )
-        full_prompt = f"Previous context:\n{history_str}\n\nNew request: {user_prompt}"
-
-    print(f"\n{'='*60}")
-    print(f"Generating: {user_prompt}")
-    print(f"{'='*60}")
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token is close enough for budgeting; exact counts would need Llama's tokenizer.
+    return len(text) // 4 + 1
+
+
+def trim_history(history: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> list[dict]:
+    # The latest user/assistant pair always survives — follow-ups ("add a sign-in button")
+    # refer to it. The opening exchange is kept next since it extends the cacheable prefix,
+    # unless it alone pushes head + tail over budget. Whole pairs are dropped from the
+    # middle, oldest first, until the rest fits; messages are never cut short.
+    counts = [h.get("tokens") or estimate_tokens(h["content"]) for h in history]
+    tail_start = max(len(history) - 2, 0)
+    head_end = min(HISTORY_HEAD_MESSAGES, tail_start)
+    head_tokens = sum(counts[:head_end])
+    tail_tokens = sum(counts[tail_start:])
+    if head_end and head_tokens + tail_tokens > budget:
+        head_end = head_tokens = 0
+
+    total = head_tokens + sum(counts[head_end:tail_start]) + tail_tokens
+    cut = head_end
+    while total > budget and cut < tail_start:
+        total -= sum(counts[cut:cut + 2])
+        cut += 2
+    return history[:head_end] + history[cut:]
+
+
+def run_pipeline(
+    user_prompt: str,
+    api_key: str,
+    conversation_history: list = None,
+    on_token: Callable[[int, str], None] | None = None,
+) -> dict:
+    client = get_client(api_key)
+    if TOKENS is None:
+        reload_tokens()
+    tokens, system_prompt = TOKENS, SYSTEM_PROMPT
+
+    history = trim_history(conversation_history or [])
+
+    logger.info("Generating: %s", user_prompt)
 
     code = ""
     all_errors = []
@@ -249,28 +502,56 @@ def run_pipeline(user_prompt: str, api_key: str, conversation_history: list = No
     feedback = ""
 
     for attempt in range(MAX_RETRIES + 1):
-        print(f"\nAttempt {attempt + 1}/{MAX_RETRIES + 1}")
-        code = generate_component(client, system_prompt, full_prompt, feedback)
-        print(f"Generated {len(code)} chars")
+        logger.info("Attempt %d/%d", attempt + 1, MAX_RETRIES + 1)
+        stream_cb = (lambda text, a=attempt + 1: on_token(a, text)) if on_token else None
+        code, finish_reason = generate_component(
+            client, system_prompt, user_prompt, feedback, history, stream_cb,
+            previous_code=code,
+            max_tokens=FIRST_ATTEMPT_MAX_TOKENS if attempt == 0 else RETRY_MAX_TOKENS,
+            precheck=attempt < MAX_RETRIES,
+        )
+        logger.info("Generated %d chars", len(code))
+
+        if finish_reason == BAD_OPENING:
+            # Only the first few dozen chars exist; linting them would just add noise.
+            errors = [ValidationError(
+                "OUTPUT_FORMAT",
+                "Output must start with `import { Component } from '@angular/core';` — "
+                "no prose, explanations or markdown fences before the code",
+            )]
+        else:
+            errors = validate_component(code, tokens)
+        if finish_reason == "length" and any(e.severity == "error" for e in errors):
+            # Cut off by max_tokens — say so up front; the linter errors are mostly fallout.
+            errors.insert(0, ValidationError(
+                "OUTPUT_FORMAT",
+                "Output hit the token limit and is incomplete — regenerate the COMPLETE component more concisely",
+            ))
+        if any(e.severity == "error" for e in errors):
+            fixed, unfixed = _autofix(code, errors, tokens)
+            if fixed != code and not any(e.severity == "error" for e in unfixed):
+                fixed_errors = validate_component(fixed, tokens)
+                if not any(e.severity == "error" for e in fixed_errors):
+                    logger.info("Auto-fixed %d token violation(s) without a retry", len(errors) - len(unfixed))
+                    code, errors = fixed, fixed_errors
 
-        errors = validate_component(code, tokens)
         hard_errors = [e for e in errors if e.severity == "error"]
         warnings    = [e for e in errors if e.severity == "warning"]
         all_errors  = errors
 
         if warnings:
-            print(f"{len(warnings)} warning(s): {[str(w) for w in warnings]}")
+            logger.info("%d warning(s): %s", len(warnings), warnings)
 
         if not hard_errors:
-            print(f"PASSED ({len(warnings)} warnings)")
+            logger.info("PASSED (%d warnings)", len(warnings))
             break
         else:
-            print(f"FAILED {len(hard_errors)} errors: {[str(e) for e in hard_errors]}")
+            logger.info("FAILED %d errors: %s", len(hard_errors), hard_errors)
             if attempt < MAX_RETRIES:
                 feedback = "LINTER ERRORS:\n" + "\n".join(str(e) for e in hard_errors)
                 feedback += "\n\nFix ALL errors. Output ONLY raw TypeScript code."
             else:
-                print("Max retries reached.")
+                logger.warning("Max retries reached.")
 
     return {
         "code":        code,
@@ -284,6 +565,7 @@ def run_pipeline(user_prompt: str, api_key: str, conversation_history: list = No
 
 
 if __name__ == "__main__":
+    configure_logging()
     api_key = os.environ.get("GROQ_API_KEY", "")
     if not api_key:
         print("Set GROQ_API_KEY environment variable")
@@ -2,13 +2,20 @@
 FastAPI server exposing the Guided Component Architect pipeline
 """
 
+import asyncio
+import hashlib
 import os
-import json
-from pathlib import Path
+import weakref
+from collections import OrderedDict
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import orjson
 from pydantic import BaseModel
-from architect import run_pipeline
+import architect
+from architect import estimate_tokens, run_pipeline, trim_history
+
+architect.configure_logging()
 
 app = FastAPI(title="Angular Component Architect", version="1.0.0")
 
@@ -19,7 +26,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-sessions: dict[str, list[dict]] = {}
+MAX_SESSIONS = 10_000
+RESULT_CACHE_SIZE = 1024
+
+
+class LRUDict(OrderedDict):
+    """Dict capped at maxsize entries; reads and writes refresh recency, overflow evicts the oldest."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+sessions: LRUDict = LRUDict(MAX_SESSIONS)
+# Weak values: a lock lives only while some request holds or awaits it.
+_session_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+_result_cache: LRUDict = LRUDict(RESULT_CACHE_SIZE)
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+def _cache_key(prompt: str, history: list[dict]) -> str:
+    # System prompt is part of the key so a token reload invalidates old results.
+    h = hashlib.blake2b(digest_size=16)
+    for part in (architect.SYSTEM_PROMPT or "").encode(), orjson.dumps(history), prompt.encode():
+        h.update(part)
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def _pipeline_task(
+    key: str, prompt: str, api_key: str, history: list[dict], on_token=None,
+) -> tuple[asyncio.Future, bool]:
+    # Identical requests arriving while one is running share its task instead of
+    # calling Groq again. Joiners don't receive the leader's streamed tokens.
+    # Returns (task, joined) — joined callers made no LLM call, so they report cached.
+    task = _inflight.get(key)
+    if task is not None:
+        return task, True
+    task = asyncio.ensure_future(asyncio.to_thread(run_pipeline, prompt, api_key, history, on_token))
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task, False
 
 
 class GenerateRequest(BaseModel):
@@ -35,21 +101,23 @@ class GenerateResponse(BaseModel):
     attempts: int
     success: bool
     session_id: str
+    cached: bool = False
 
 
-@app.post("/generate", response_model=GenerateResponse)
-async def generate(req: GenerateRequest):
+def _api_key() -> str:
     api_key = os.environ.get("GROQ_API_KEY", "")
     if not api_key:
         raise HTTPException(500, "GROQ_API_KEY not configured on server")
+    return api_key
 
-    history = sessions.get(req.session_id, [])
-    result = run_pipeline(req.prompt, api_key, conversation_history=history)
 
-    history.append({"role": "user", "content": req.prompt})
-    history.append({"role": "assistant", "content": result["code"][:500]})
-    sessions[req.session_id] = history[-20:]
+def _remember(session_id: str, history: list[dict], prompt: str, result: dict) -> None:
+    for role, content in (("user", prompt), ("assistant", result["code"])):
+        history.append({"role": role, "content": content, "tokens": estimate_tokens(content)})
+    sessions[session_id] = trim_history(history)
 
+
+def _response(result: dict, session_id: str, cached: bool) -> GenerateResponse:
     return GenerateResponse(
         code=result["code"],
         errors=result["errors"],
@@ -57,23 +125,89 @@ async def generate(req: GenerateRequest):
         hard_errors=result["hard_errors"],
         attempts=result["attempts"],
         success=result["success"],
-        session_id=req.session_id,
+        session_id=session_id,
+        cached=cached,
     )
 
 
+@app.post("/generate", response_model=GenerateResponse)
+async def generate(req: GenerateRequest):
+    api_key = _api_key()
+
+    # The Groq client is blocking — run it in a worker thread so other requests keep flowing.
+    # Turns within one session are serialized so history updates never interleave.
+    async with _session_lock(req.session_id):
+        history = sessions.get(req.session_id, [])
+        key = _cache_key(req.prompt, history)
+        result = _result_cache.get(key)
+        cached = result is not None
+        if not cached:
+            task, cached = _pipeline_task(key, req.prompt, api_key, history)
+            # shield: a disconnecting client must not cancel work other callers are awaiting.
+            result = await asyncio.shield(task)
+            if result["success"]:
+                _result_cache[key] = result
+        _remember(req.session_id, history, req.prompt, result)
+
+    return _response(result, req.session_id, cached)
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest):
+    """NDJSON stream: {"type": "token", "attempt", "content"} lines, then one {"type": "result", ...}."""
+    api_key = _api_key()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_token(attempt: int, text: str):
+        event = {"type": "token", "attempt": attempt, "content": text}
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def events():
+        async with _session_lock(req.session_id):
+            history = sessions.get(req.session_id, [])
+            key = _cache_key(req.prompt, history)
+            result = _result_cache.get(key)
+            cached = result is not None
+            if not cached:
+                task, cached = _pipeline_task(key, req.prompt, api_key, history, on_token)
+                task.add_done_callback(lambda _: queue.put_nowait(None))
+                while (event := await queue.get()) is not None:
+                    yield orjson.dumps(event) + b"\n"
+                try:
+                    result = task.result()
+                except Exception as e:
+                    # Headers are already sent, so a status code is no longer an option —
+                    # end the stream with a terminal error event instead of cutting it off.
+                    yield orjson.dumps({"type": "error", "detail": str(e)}) + b"\n"
+                    return
+                if result["success"]:
+                    _result_cache[key] = result
+            _remember(req.session_id, history, req.prompt, result)
+
+        yield orjson.dumps({"type": "result", **_response(result, req.session_id, cached).model_dump()}) + b"\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/tokens")
 async def get_tokens():
-    possible_paths = [
-        Path(__file__).parent.parent / "design-system" / "tokens.json",
-        Path(__file__).parent / "tokens.json",
-        Path("design-system") / "tokens.json",
-        Path("../design-system") / "tokens.json",
-    ]
-    for p in possible_paths:
-        if p.exists():
-            with open(p) as f:
-                return json.load(f)
-    raise HTTPException(404, "tokens.json not found")
+    if architect.TOKENS is None:
+        raise HTTPException(404, "tokens.json not found")
+    return architect.TOKENS
+
+
+@app.post("/tokens/reload")
+async def reload_tokens():
+    try:
+        return architect.reload_tokens()
+    except FileNotFoundError:
+        raise HTTPException(404, "tokens.json not found")
+    except orjson.JSONDecodeError as e:
+        # The previously loaded tokens stay active until the file parses again.
+        raise HTTPException(422, f"tokens.json is not valid JSON: {e}")
+    except KeyError as e:
+        raise HTTPException(422, f"tokens.json is missing required key {e}")
 
 
 @app.delete("/session/{session_id}")
@@ -82,6 +216,11 @@ async def clear_session(session_id: str):
     return {"cleared": session_id}
 
 
+@app.get("/session_count")
+async def session_count():
+    return {"sessions": len(sessions), "max_sessions": MAX_SESSIONS}
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok", "groq_key_set": bool(os.environ.get("GROQ_API_KEY"))}